@@ -13,11 +13,27 @@
 # under the License.
 
 from dateutil import parser
+from datetime import datetime
+import abc
+import collections
+import contextlib
 import re
 import hashlib
 import json
-
+import random
+import socket
+import threading
+import time
+import types
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
 from oslo_log import log
 import flask
 
@@ -40,54 +56,291 @@ RXT_SESSION_CACHE.expiration_time = 120
 RXT_SERVICE_CACHE = ks_cache.create_region(name="rxt_srv")
 ks_cache.cache.configure_cache_region(keystone.conf.CONF, RXT_SERVICE_CACHE)
 RXT_SERVICE_CACHE.expiration_time = 60
+# Cached service catalogs expire up to RXT_SERVICE_CACHE_JITTER seconds early
+# so that entries created together do not all expire together. During the
+# final RXT_SERVICE_CACHE_REFRESH seconds of an entry's life the cached
+# catalog is still served while it is refreshed in the background.
+RXT_SERVICE_CACHE_JITTER = 10
+RXT_SERVICE_CACHE_REFRESH = 15
+# Maximum number of service catalog entries kept in the per-process cache.
+RXT_LOCAL_CACHE_SIZE = 1024
 
 LOG = log.getLogger(__name__)
 PROVIDERS = mapped.PROVIDERS
 RACKPSACE_IDENTITY_V2 = "https://identity.api.rackspacecloud.com/v2.0/tokens"
 
+_API_KEY_LENGTHS = frozenset((32, 40, 64))
+_HEX_DIGITS = b"0123456789abcdefABCDEF"
+_SESSION_ID_RE = re.compile(r"""sessionId='(.*?[^\\])'""")
+_EMPTY_HEADERS = types.MappingProxyType({})
+# Sentinel for lazily computed per-instance values. functools.cached_property
+# is avoided as it serializes every instance on one lock before Python 3.12.
+_UNSET = object()
+# Cache regions share the backend key namespace, so session keys are prefixed
+# to keep them apart from the hashed service catalog keys.
+_SESSION_KEY_PREFIX = "sess:"
+
+# TCP keepalive stops idle pooled connections from being silently dropped by
+# middleboxes, which would otherwise cost a fresh TCP and TLS handshake.
+_SOCKET_OPTIONS = HTTPConnection.default_socket_options + [
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+]
+if hasattr(socket, "TCP_KEEPIDLE"):
+    _SOCKET_OPTIONS += [
+        (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60),
+        (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10),
+        (socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3),
+    ]
+
+
+def _json_dumps(obj):
+    """Return the JSON encoded bytes for an object.
+
+    orjson is used when it is installed, otherwise the standard library.
+
+    :param obj: The object to be encoded.
+    :returns: The JSON document.
+    :rtype: bytes
+    """
+
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+def _json_loads(data):
+    """Return the object decoded from a JSON document.
+
+    :param bytes data: The JSON document.
+    :returns: The decoded object.
+    """
+
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class _KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter which enables TCP keepalive on pooled connections."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault("socket_options", _SOCKET_OPTIONS)
+        super(_KeepAliveAdapter, self).init_poolmanager(*args, **kwargs)
+
+
+# A single pooled session is shared by every authentication so that logins
+# reuse the established TLS connections to Rackspace Identity.
+_RXT_SESSION = requests.Session()
+_RXT_SESSION.mount(
+    "https://",
+    _KeepAliveAdapter(
+        pool_connections=16,
+        pool_maxsize=64,
+        max_retries=Retry(total=2, backoff_factor=0.1),
+    ),
+)
+_RXT_SESSION.headers["Content-Type"] = "application/json"
+_RXT_TIMEOUT = (3, 10)
+
+_INFLIGHT = dict()
+_INFLIGHT_LOCK = threading.Lock()
+_INFLIGHT_TIMEOUT = 15
+
+_LOCAL_CACHE = collections.OrderedDict()
+_LOCAL_CACHE_LOCK = threading.Lock()
+
+
+@contextlib.contextmanager
+def _single_flight(key):
+    """Collapse concurrent Rackspace Identity requests for the same key.
+
+    The first caller for a key becomes the leader and yields True. Any caller
+    arriving while the leader is running waits for it to finish, for at most
+    `_INFLIGHT_TIMEOUT` seconds, and then yields False so that it can re-check
+    the caches before contacting Rackspace Identity on its own.
+
+    :param str key: The cache key being resolved.
+    :returns: True if the caller is the leader for the key.
+    :rtype: bool
+    """
+
+    leader, event = _claim_flight(key)
+    if not leader:
+        event.wait(timeout=_INFLIGHT_TIMEOUT)
+        yield False
+        return
+
+    try:
+        yield True
+    finally:
+        _release_flight(key, event)
+
+
+def _claim_flight(key):
+    """Register the caller as the leader for a key if nobody else is.
+
+    :param str key: The cache key being resolved.
+    :returns: A tuple of whether the caller is the leader and the event for
+              the key.
+    :rtype: tuple
+    """
+
+    with _INFLIGHT_LOCK:
+        event = _INFLIGHT.get(key)
+        if event is not None:
+            return False, event
+        event = _INFLIGHT[key] = threading.Event()
+        return True, event
+
+
+def _release_flight(key, event):
+    """Release a key claimed with `_claim_flight` and wake any waiters.
+
+    :param str key: The cache key being resolved.
+    :param threading.Event event: The event returned by `_claim_flight`.
+    """
+
+    with _INFLIGHT_LOCK:
+        _INFLIGHT.pop(key, None)
+    event.set()
+
+
+def _local_cache_get(key):
+    """Return an entry from the per-process service catalog cache.
+
+    Entries which are due for a refresh are dropped and None is returned so
+    that the caller consults the shared cache region.
 
-class RXTv2Credentials(object):
+    :param str key: The cache key.
+    :returns: The cached entry or None.
+    :rtype: dict or None
+    """
+
+    if not keystone.conf.CONF.cache.enabled:
+        return None
+
+    with _LOCAL_CACHE_LOCK:
+        entry = _LOCAL_CACHE.get(key)
+        if entry is None:
+            return None
+        if entry["refresh_at"] < time.time():
+            del _LOCAL_CACHE[key]
+            return None
+        _LOCAL_CACHE.move_to_end(key)
+        return entry
+
+
+def _local_cache_set(key, entry):
+    """Store an entry in the per-process service catalog cache.
+
+    The least recently used entry is dropped once the cache holds more than
+    `RXT_LOCAL_CACHE_SIZE` entries.
+
+    :param str key: The cache key.
+    :param dict entry: The entry to be cached.
+    """
+
+    if not keystone.conf.CONF.cache.enabled:
+        return
+
+    with _LOCAL_CACHE_LOCK:
+        _LOCAL_CACHE[key] = entry
+        _LOCAL_CACHE.move_to_end(key)
+        if len(_LOCAL_CACHE) > RXT_LOCAL_CACHE_SIZE:
+            _LOCAL_CACHE.popitem(last=False)
+
+
+def _local_cache_delete(key):
+    """Remove an entry from the per-process service catalog cache.
+
+    :param str key: The cache key.
+    """
+
+    with _LOCAL_CACHE_LOCK:
+        _LOCAL_CACHE.pop(key, None)
+
+
+class RXTv2Credentials(object, metaclass=abc.ABCMeta):
     """Return an authenticate object based on the provided auth payload.
 
     Check the value type of the provided auth payload and determine the
     correct authentication method.
     """
 
-    hash_types = [r"^[a-fA-F0-9]{%s}$" % i for i in [32, 40, 64]]
+    refresh_catalog = True
     rxt_auth_payload = None
-    rxt_headers = dict()
-    session = requests.Session()
-    session_id = None
+    rxt_headers = _EMPTY_HEADERS
 
     def __init__(self, auth_payload):
         """Initialize the RXTv2Credentials object.
 
         This method is used to initialize the RXTv2Credentials object. The
-        method will hash the auth payload and username for use in caching
-        and session headers.
+        method will parse the user credentials out of the auth payload once
+        so that they can be used to build the cache keys. The session header
+        is cached under the prefixed username.
 
         :param dict auth_payload: The auth payload to be used for authentication.
         """
 
         self.auth_payload = auth_payload
-        self.hashed_auth_payload = hashlib.sha224(
-            json.dumps(self.auth_payload, sort_keys=True).encode("utf-8")
-        ).hexdigest()
-        self.hashed_auth_user = hashlib.sha224(
-            self._username.encode("utf-8")
-        ).hexdigest()
-        self.session_id = self._sessionID
+        user = auth_payload.get("user", {})
+        self._username = user.get("name") or user.get("username")
+        if not self._username:
+            raise exception.Unauthorized(
+                _("The authentication payload is missing the name")
+            )
+        self._password = user.get("password")
+        self._passcode = user.get("passcode")
+        self._hashed_auth_payload = _UNSET
+        self._session_id = _UNSET
 
     def __exit__(self, *args, **kwargs):
-        """Close the session.
+        """Complete the authentication.
 
-        This method is used to close the session after the authentication
-        method has completed.
+        The shared session is intentionally left open so that its pooled
+        connections can be reused by the next authentication.
         """
 
-        self.session.close()
         LOG.debug(_("Rackspace IDP Login complete, returning to OS"))
 
+    @property
+    def hashed_auth_payload(self):
+        """Return the key used to cache the service catalog.
+
+        The key is only computed when the cache is first consulted and is
+        built from the credential fields rather than the whole auth payload,
+        as those are the only fields that change the service catalog.
+
+        :returns: The hashed auth payload.
+        :rtype: str
+        """
+
+        if self._hashed_auth_payload is _UNSET:
+            self._hashed_auth_payload = hashlib.blake2b(
+                "{username}\0{password}\0{passcode}".format(
+                    username=self._username,
+                    password=self._password or "",
+                    passcode=self._passcode or "",
+                ).encode("utf-8"),
+                digest_size=16,
+            ).hexdigest()
+        return self._hashed_auth_payload
+
+    @property
+    def session_id(self):
+        """Return the sessionID used for MFA.
+
+        The session header is only looked up when a login actually needs it,
+        so cached logins and API key logins never touch the session cache.
+
+        :returns: The sessionID from the session header.
+        :rtype: str or None
+        """
+
+        if self._session_id is _UNSET:
+            self._session_id = self._sessionID
+        return self._session_id
+
     @property
     def _sessionID(self):
         """Return a parsed sessionID property.
@@ -101,7 +354,9 @@ class RXTv2Credentials(object):
         :rtype: str or None
         """
 
-        session_id = RXT_SESSION_CACHE.get(self.hashed_auth_user)
+        session_id = RXT_SESSION_CACHE.get(
+            _SESSION_KEY_PREFIX + self._username
+        )
         if session_id:
             LOG.debug(_("Using cached Rackspace Session header"))
             return session_id
@@ -111,45 +366,34 @@ class RXTv2Credentials(object):
             LOG.debug(_("Using environmental Rackspace Session header"))
             return session_id
 
-    @property
-    def _username(self):
-        """Return a parsed username property.
-
-        This property is used to return the username from the auth payload.
-
-        :returns: The username from the auth payload.
-        :rtype: str
-        """
-
-        try:
-            return self.auth_payload["user"]["name"]
-        except KeyError:
-            try:
-                return self.auth_payload["user"]["username"]
-            except KeyError:
-                raise exception.Unauthorized(
-                    _("The authentication payload is missing the name")
-                )
-
     @staticmethod
     def _return_session_id(session_header):
         """Return the sessionID from the session header.
 
         Using the provided session header, return the sessionID from the
-        session header if it exists.
+        session header if it exists. The header has a fixed format so plain
+        string partitioning is used, falling back to a regular expression
+        only when the value may contain escaped quotes.
 
         :param str session_header: The session header to be parsed.
         :returns: The sessionID from the session header.
         :rtype: str or None
         """
 
-        r = re.compile(r"""sessionId='(.*?[^\\])'""")
-        try:
-            return r.findall(session_header).pop()
-        except IndexError:
+        found, rest = session_header.partition("sessionId='")[1:]
+        if "\\" in rest:
+            match = _SESSION_ID_RE.search(session_header)
+            session_id = match.group(1) if match else None
+        else:
+            session_id, closed = rest.partition("'")[:2]
+            if not (found and closed):
+                session_id = None
+
+        if not session_id:
             raise exception.AuthPluginException(
                 _("Could not parse the Rackspace Session header for sessionId")
             )
+        return session_id
 
     def _set_session_id(self, session_header):
         """Set the sessionID from the session header into the local cache.
@@ -165,7 +409,7 @@ class RXTv2Credentials(object):
         session_id = self._return_session_id(session_header=session_header)
         if session_id:
             RXT_SESSION_CACHE.set(
-                self.hashed_auth_user,
+                _SESSION_KEY_PREFIX + self._username,
                 session_id,
             )
             flask.request.environ["RXT_SessionID"] = session_id
@@ -194,43 +438,46 @@ class RXTv2Credentials(object):
                                     environment.
         """
 
-        if username:
-            flask.request.environ["RXT_UserName"] = username
-        if email:
-            flask.request.environ["RXT_Email"] = email
-        if domain_id:
-            flask.request.environ["RXT_DomainID"] = domain_id
-        if tenant_name:
-            flask.request.environ["RXT_TenantName"] = tenant_name
-        if tenant_id:
-            flask.request.environ["RXT_TenantID"] = tenant_id
-        if org_person_type:
-            flask.request.environ["RXT_orgPersonType"] = org_person_type
+        flask.request.environ.update(
+            {
+                key: value
+                for key, value in (
+                    ("RXT_UserName", username),
+                    ("RXT_Email", email),
+                    ("RXT_DomainID", domain_id),
+                    ("RXT_TenantName", tenant_name),
+                    ("RXT_TenantID", tenant_id),
+                    ("RXT_orgPersonType", org_person_type),
+                )
+                if value
+            }
+        )
 
     def _parse_service_catalog(self, service_catalog):
-        """Parse the Rackspace Service Catalog and set the environment variables.
+        """Parse the Rackspace Service Catalog into the federation fields.
+
+        We're parsing the Rackspace Service Catalog into the values used for
+        the federation environment variables. If there's an error parsing the
+        service catalog the method will deny access.
 
-        We're parsing the Rackspace Service Catalog and setting the federation
-        environment variables. If there's an error parsing the service catalog
-        the method will deny access.
+        :param dict service_catalog: The Rackspace service catalog.
+        :returns: The keyword arguments for `_set_federation_env`.
+        :rtype: dict
         """
 
         try:
             access = service_catalog["access"]
             access_user = access["user"]
-            access_token = access["token"]
-            access_user_roles = set(
-                [
-                    i["name"].split(":")[-1]
-                    for i in service_catalog["access"]["user"]["roles"]
-                ]
-            )
-            self._set_federation_env(
+            access_tenant = access["token"]["tenant"]
+            access_user_roles = {
+                i["name"].rpartition(":")[2] for i in access_user["roles"]
+            }
+            return dict(
                 username=access_user["name"],
                 email=access_user["email"],
                 domain_id=access_user["RAX-AUTH:domainId"],
-                tenant_name=access_token["tenant"]["name"],
-                tenant_id=access_token["tenant"]["id"],
+                tenant_name=access_tenant["name"],
+                tenant_id=access_tenant["id"],
                 org_person_type=";".join(access_user_roles),
             )
         except KeyError as e:
@@ -276,48 +523,256 @@ class RXTv2Credentials(object):
             response_data=response_data,
         )
 
-    def get_rxt_auth(self, auth_data, auth_type):
-        """Authenticate using the Rackspace Identity API.
+    @abc.abstractmethod
+    def _select_auth_payload(self):
+        """Return the auth type and auth payload used to authenticate.
 
-        Internal method used to authenticate using the Rackspace Identity API.
-        The method will return True if the Rackspace Identity API returns a
-        boolean. The boolean informs the main auth method if the user is
-        attempting to use rackspace MFA.
+        :returns: The auth type and auth payload.
+        :rtype: tuple
+        """
 
-        :param dict auth_data: The auth data to be used for authentication.
-        :param str auth_type: The auth type to be used for authentication.
-        :returns: True if the Rackspace Identity API returns a boolean.
-        :rtype: bool
+    def _cached_auth_handler(self):
+        """Return an auth handler response from the cached service catalog.
+
+        :returns: An auth handler response or None if nothing usable is cached.
+        :rtype: keystone.auth.plugins.base.AuthHandlerResponse or None
         """
-        service_catalog = RXT_SERVICE_CACHE.get(self.hashed_auth_payload)
-        if service_catalog:
+
+        federation = self._cached_federation()
+        if federation is not None:
+            self._set_federation_env(**federation)
+            return self._return_auth_handler()
+
+    def _cached_federation(self):
+        """Return the federation fields from the cached service catalog.
+
+        The cache holds the federation fields parsed from the service catalog
+        along with the token expiry, so a hit does not walk the catalog
+        again. Cached entries are only used when the token has not expired.
+        Invalid or expired entries are removed from the cache. When the cached
+        entry is close to expiring it is refreshed in the background while
+        the cached entry is used. The per-process cache is checked before the
+        shared cache region, and only entries which are not yet due for a
+        refresh are kept in it.
+
+        :returns: The cached federation fields or None if nothing usable is
+                  cached.
+        :rtype: dict or None
+        """
+
+        cached = _local_cache_get(self.hashed_auth_payload)
+        from_local = cached is not None
+        if not from_local:
+            cached = RXT_SERVICE_CACHE.get(self.hashed_auth_payload)
+
+        if cached:
             try:
-                expires = service_catalog["access"]["token"]["expires"]
-            except KeyError:
+                federation = cached["federation"]
+                token_expire = cached["token_expire"]
+                refresh_at = cached["refresh_at"]
+                expires_at = cached["expires_at"]
+            except (KeyError, TypeError):
                 LOG.debug(
                     _("Rackspace service catalog is invalid, running cleanup.")
                 )
-                RXT_SERVICE_CACHE.delete(self.hashed_auth_payload)
+                self._evict_service_catalog()
             else:
-                token_expire = parser.parse(expires)
-                if token_expire.timestamp() > token_expire.now().timestamp():
+                now = time.time()
+                token_valid = token_expire > datetime.now(token_expire.tzinfo)
+                if expires_at > now and token_valid:
                     LOG.debug(_("Using cached Rackspace service catalog"))
-                    self._parse_service_catalog(
-                        service_catalog=service_catalog
-                    )
-                    return self._return_auth_handler()
+                    if refresh_at < now:
+                        self._refresh_service_catalog()
+                    elif not from_local:
+                        _local_cache_set(self.hashed_auth_payload, cached)
+                    return federation
                 else:
                     LOG.debug(
                         _(
                             "Rackspace service catalog is expired, running cleanup."
                         )
                     )
-                    RXT_SERVICE_CACHE.delete(self.hashed_auth_payload)
+                    self._evict_service_catalog()
+
+    def _cache_service_catalog(self, service_catalog, federation):
+        """Store the parsed service catalog in the cache.
+
+        The entry is stored with a jittered lifetime. Catalogs without a token
+        expiry are not cached.
+
+        :param dict service_catalog: The Rackspace service catalog.
+        :param dict federation: The fields returned by
+                                `_parse_service_catalog`.
+        """
+
+        try:
+            token_expire = parser.isoparse(
+                service_catalog["access"]["token"]["expires"]
+            )
+        except (KeyError, ValueError):
+            LOG.debug(_("Rackspace service catalog is invalid, not caching."))
+            return
+
+        expires_at = (
+            time.time()
+            + RXT_SERVICE_CACHE.expiration_time
+            - random.uniform(0, RXT_SERVICE_CACHE_JITTER)
+        )
+        entry = {
+            "federation": federation,
+            "token_expire": token_expire,
+            "refresh_at": expires_at - RXT_SERVICE_CACHE_REFRESH,
+            "expires_at": expires_at,
+        }
+        RXT_SERVICE_CACHE.set(self.hashed_auth_payload, entry)
+        _local_cache_set(self.hashed_auth_payload, entry)
+
+    def _evict_service_catalog(self):
+        """Remove the service catalog from the shared and local caches."""
+
+        RXT_SERVICE_CACHE.delete(self.hashed_auth_payload)
+        _local_cache_delete(self.hashed_auth_payload)
+
+    def _refresh_service_catalog(self):
+        """Refresh the cached service catalog in a background thread.
+
+        Only one refresh runs for a given auth payload at a time. Classes
+        which set `refresh_catalog` to False leave their catalogs to expire.
+        """
+
+        if not self.refresh_catalog:
+            return
+
+        leader, event = _claim_flight(self.hashed_auth_payload)
+        if not leader:
+            return
+
+        LOG.debug(_("Refreshing cached Rackspace service catalog"))
+        try:
+            auth_data = self._select_auth_payload()[1]
+            threading.Thread(
+                target=self._background_refresh,
+                args=(auth_data, event),
+                daemon=True,
+            ).start()
+        except Exception as e:
+            # The cached catalog is still valid, so the login carries on and
+            # the next one is free to claim the refresh.
+            _release_flight(self.hashed_auth_payload, event)
+            LOG.warning(
+                _(
+                    "Rackspace service catalog refresh failed to start:"
+                    " {error}".format(error=e)
+                )
+            )
+
+    def _background_refresh(self, auth_data, event):
+        """Fetch and cache a new service catalog outside of the request.
+
+        :param dict auth_data: The auth data to be used for authentication.
+        :param threading.Event event: The event claimed for the auth payload.
+        """
+
+        try:
+            r = self._identity_post(auth_data=auth_data)
+            if r.status_code == 200:
+                service_catalog = _json_loads(r.content)
+                self._cache_service_catalog(
+                    service_catalog=service_catalog,
+                    federation=self._parse_service_catalog(
+                        service_catalog=service_catalog
+                    ),
+                )
+            else:
+                LOG.debug(
+                    _(
+                        "Rackspace service catalog refresh returned"
+                        " {status}".format(status=r.status_code)
+                    )
+                )
+        except Exception as e:
+            LOG.warning(
+                _(
+                    "Rackspace service catalog refresh failed: {error}".format(
+                        error=e
+                    )
+                )
+            )
+        finally:
+            _release_flight(self.hashed_auth_payload, event)
 
+    def _identity_post(self, auth_data):
+        """Post the auth data to the Rackspace Identity API.
+
+        :param dict auth_data: The auth data to be used for authentication.
+        :returns: The Rackspace Identity API response.
+        :rtype: requests.Response
+        """
+
+        return _RXT_SESSION.post(
+            RACKPSACE_IDENTITY_V2,
+            data=_json_dumps(auth_data),
+            headers=self.rxt_headers,
+            timeout=_RXT_TIMEOUT,
+        )
+
+    def get_rxt_auth(self, auth_data, auth_type):
+        """Authenticate using the Rackspace Identity API.
+
+        Internal method used to authenticate using the Rackspace Identity API.
+        The method will return True if the Rackspace Identity API returns a
+        boolean. The boolean informs the main auth method if the user is
+        attempting to use rackspace MFA.
+
+        :param dict auth_data: The auth data to be used for authentication.
+        :param str auth_type: The auth type to be used for authentication.
+        :returns: True if the Rackspace Identity API returns a boolean.
+        :rtype: bool
+        """
         if auth_type == "passwordCredentials" and self.session_id:
             LOG.debug(_("Found cached Rackspace session header for MFA."))
             return self._return_auth_handler(status=False)
 
+        # Password logins are collapsed per user so that a burst of MFA
+        # logins only negotiates a single session header.
+        if auth_type == "passwordCredentials":
+            flight_key = self._username
+        else:
+            flight_key = self.hashed_auth_payload
+
+        with _single_flight(flight_key):
+            # Another login may have filled the caches between our cache miss
+            # and taking the flight, so they are always checked again here.
+            federation = self._cached_federation()
+            if federation is not None:
+                self._set_federation_env(**federation)
+                status = True
+            elif auth_type == "passwordCredentials" and self._sessionID:
+                LOG.debug(_("Found cached Rackspace session header for MFA."))
+                status = False
+            else:
+                service_catalog = self._post_rxt_auth(
+                    auth_data=auth_data, auth_type=auth_type
+                )
+                status = service_catalog is not None
+
+        return self._return_auth_handler(status=status)
+
+    def _post_rxt_auth(self, auth_data, auth_type):
+        """Post the auth data to the Rackspace Identity API.
+
+        A successful response is parsed into the federation environment and
+        cached as the service catalog. When Rackspace Identity answers with an
+        MFA challenge the session header is cached instead and None is
+        returned. Connection errors and timeouts are raised as an
+        AuthPluginException.
+
+        :param dict auth_data: The auth data to be used for authentication.
+        :param str auth_type: The auth type to be used for authentication.
+        :returns: The Rackspace service catalog or None if MFA is required.
+        :rtype: dict or None
+        """
+
         LOG.debug(
             _(
                 "Attempting to authenticate using {auth_type}".format(
@@ -325,65 +780,96 @@ class RXTv2Credentials(object):
                 )
             )
         )
-        r = self.session.post(
-            RACKPSACE_IDENTITY_V2,
-            json=auth_data,
-            headers=self.rxt_headers,
-        )
+        try:
+            r = self._identity_post(auth_data=auth_data)
+        except requests.RequestException as e:
+            LOG.error(
+                _(
+                    "Failed to reach the Rackspace Identity API:"
+                    " {error}".format(error=e)
+                )
+            )
+            raise exception.AuthPluginException(
+                _("Could not reach the Rackspace Identity API")
+            )
+
         if r.status_code == 401 and "WWW-Authenticate" in r.headers:
             LOG.debug(_("Caching Rackspace session header"))
             self._set_session_id(session_header=r.headers["WWW-Authenticate"])
-            return self._return_auth_handler(status=False)
+            return None
         else:
             r.raise_for_status()
-            service_catalog = r.json()
-            self._parse_service_catalog(service_catalog=service_catalog)
+            service_catalog = _json_loads(r.content)
+            federation = self._parse_service_catalog(
+                service_catalog=service_catalog
+            )
+            self._set_federation_env(**federation)
             LOG.debug(_("Caching Rackspace service catalog"))
-            RXT_SERVICE_CACHE.set(self.hashed_auth_payload, service_catalog)
-            return self._return_auth_handler()
+            self._cache_service_catalog(
+                service_catalog=service_catalog, federation=federation
+            )
+            return service_catalog
 
 
 class RXPWAuth(RXTv2Credentials):
     """Rackspace Password Authentication."""
 
+    # An apiKeyCredentials failure is retried once with passwordCredentials.
+    max_auth_attempts = 2
+
     def __enter__(self):
-        """Return the correct authentication method.
+        """Start the authentication.
 
-        This method is used to return the authentication method which is
-        evaluating the password parameter in the auth payload. If the
-        password is a valid `hash_types` then the auth method is first
-        apiKeyCredentials, otherwise the passwordCredentials will be used.
+        The authentication method is selected by `_select_auth_payload`
+        once `rxt_auth` knows that the service catalog is not cached.
         """
 
         LOG.debug(_("Rackspace IDP Login started"))
-        for hash_type in self.hash_types:
-            if re.match(hash_type, self._password) is not None:
-                self.rxt_auth_payload = self.apiKeyCredentials
-                break
-
-        if not self.rxt_auth_payload:
-            self.rxt_auth_payload = self.passwordCredentials
-
         return self
 
-    @property
-    def _password(self):
-        """Return a parsed password property.
+    def _select_auth_payload(self):
+        """Return the correct authentication method.
 
-        This property is used to return the password from the auth payload.
+        This method is used to return the authentication method which is
+        evaluating the password parameter in the auth payload. If the
+        password looks like an API key then the auth method is first
+        apiKeyCredentials, otherwise the passwordCredentials will be used.
 
-        :returns: The password from the auth payload.
-        :rtype: str
+        :returns: The auth type and auth payload.
+        :rtype: tuple
         """
 
-        try:
-            return self.auth_payload["user"]["password"]
-        except KeyError:
+        if self._password is None:
             raise exception.Unauthorized(
                 _("The authentication payload is missing the password")
             )
 
-    @property
+        if self._is_api_key(self._password):
+            return self.apiKeyCredentials()
+        else:
+            return self.passwordCredentials()
+
+    @staticmethod
+    def _is_api_key(secret):
+        """Return True when the secret looks like a Rackspace API key.
+
+        API keys are 32, 40, or 64 character hex strings. The length check
+        runs first so that typical passwords are rejected without looking at
+        the individual characters; the remaining candidates are checked by
+        deleting every hex digit with `bytes.translate`, which leaves nothing
+        behind only for a hex string.
+
+        :param str secret: The secret to be evaluated.
+        :returns: True if the secret is shaped like an API key.
+        :rtype: bool
+        """
+
+        return (
+            len(secret) in _API_KEY_LENGTHS
+            and secret.isascii()
+            and not secret.encode("ascii").translate(None, _HEX_DIGITS)
+        )
+
     def apiKeyCredentials(self):
         """Return the API type.
 
@@ -403,7 +889,6 @@ class RXPWAuth(RXTv2Credentials):
             }
         }
 
-    @property
     def passwordCredentials(self):
         """Return the Password type.
 
@@ -438,66 +923,75 @@ class RXPWAuth(RXTv2Credentials):
         :rtype: keystone.auth.plugins.base.AuthHandlerResponse
         """
 
-        try:
+        auth_handler = self._cached_auth_handler()
+        if auth_handler is not None:
+            return auth_handler
+
+        self.rxt_auth_payload = self._select_auth_payload()
+        for attempt in range(1, self.max_auth_attempts + 1):
             auth_type, auth_data = self.rxt_auth_payload
-            return self.get_rxt_auth(auth_data=auth_data, auth_type=auth_type)
-        except requests.HTTPError:
-            if auth_type == "apiKeyCredentials":
-                self.rxt_auth_payload = self.passwordCredentials
-                LOG.debug(
-                    _(
-                        "Attempting to re-authenticate using passwordCredentials"
-                    )
+            try:
+                return self.get_rxt_auth(
+                    auth_data=auth_data, auth_type=auth_type
                 )
-                return self.rxt_auth()
+            except requests.HTTPError:
+                if (
+                    auth_type == "apiKeyCredentials"
+                    and attempt < self.max_auth_attempts
+                ):
+                    self.rxt_auth_payload = self.passwordCredentials()
+                    LOG.debug(
+                        _(
+                            "Attempting to re-authenticate using"
+                            " passwordCredentials"
+                        )
+                    )
+                    continue
 
-            raise exception.Unauthorized(
-                _(
-                    "Failed to authenticate using the Rackspace Identity API"
-                    " with {auth_type}".format(auth_type=auth_type)
+                raise exception.Unauthorized(
+                    _(
+                        "Failed to authenticate using the Rackspace Identity"
+                        " API with {auth_type}".format(auth_type=auth_type)
+                    )
                 )
-            )
 
 
 class RXTTOTPAuth(RXTv2Credentials):
     """Rackspace TOTP Authentication."""
 
+    # Passcodes are single use and can not be replayed to refresh a catalog.
+    refresh_catalog = False
+
     def __enter__(self):
-        """Return the correct authentication method.
+        """Start the authentication.
 
-        This method is used to return the authentication method which is
-        evaluating the password parameter in the auth payload. If the
-        password is a valid `hash_types` then the auth method is first
-        apiKeyCredentials, otherwise the passwordCredentials will be used.
+        The authentication method is selected by `_select_auth_payload`
+        once `rxt_auth` knows that the service catalog is not cached.
         """
 
         LOG.debug(_("Rackspace IDP Login started for TOTP"))
-        if not self._passcode and not self.session_id:
-            raise exception.Unauthorized(
-                _("Missing passcode or sessionID for TOTP, aborting.")
-            )
-
-        self.rxt_auth_payload = self.passcodeCredentials
-        self.rxt_headers["X-SessionId"] = self.session_id
-
         return self
 
-    @property
-    def _passcode(self):
-        """Return a parsed passcode property.
+    def _select_auth_payload(self):
+        """Return the correct authentication method.
 
-        This property is used to return the passcode from the auth payload.
+        This method is used to return the passcodeCredentials auth payload
+        and set the session header required to complete the MFA login.
 
-        :returns: The passcode from the auth payload.
-        :rtype: str or None
+        :returns: The auth type and auth payload.
+        :rtype: tuple
         """
 
-        try:
-            return self.auth_payload["user"]["passcode"]
-        except KeyError:
-            return None
+        if not self._passcode and not self.session_id:
+            raise exception.Unauthorized(
+                _("Missing passcode or sessionID for TOTP, aborting.")
+            )
+
+        if self.session_id:
+            self.rxt_headers = {"X-SessionId": self.session_id}
+
+        return self.passcodeCredentials()
 
-    @property
     def passcodeCredentials(self):
         """Return the Passcode type.
 
@@ -527,6 +1021,12 @@ class RXTTOTPAuth(RXTv2Credentials):
         :rtype: keystone.auth.plugins.base.AuthHandlerResponse
         """
 
+        auth_handler = self._cached_auth_handler()
+        if auth_handler is not None:
+            return auth_handler
+
+        self.rxt_auth_payload = self._select_auth_payload()
+
         try:
             auth_type, auth_data = self.rxt_auth_payload
             return self.get_rxt_auth(auth_data=auth_data, auth_type=auth_type)
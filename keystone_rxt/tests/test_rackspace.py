@@ -0,0 +1,154 @@
+# Copyright 2023 Cloudnull <kevin@cloudnull.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+
+from dogpile.cache import make_region
+import flask
+
+import keystone.conf
+
+from keystone_rxt import rackspace
+
+SERVICE_CATALOG = {
+    "access": {
+        "token": {
+            "expires": "2099-01-01T00:00:00.000Z",
+            "tenant": {"name": "tenant", "id": "1234"},
+        },
+        "user": {
+            "name": "bob",
+            "email": "bob@example.com",
+            "RAX-AUTH:domainId": "1234",
+            "roles": [{"name": "identity:user-admin"}],
+        },
+    }
+}
+
+
+class FakeResponse(object):
+    """A minimal stand in for the Rackspace Identity API response."""
+
+    status_code = 200
+    headers = {}
+    content = json.dumps(SERVICE_CATALOG).encode("utf-8")
+
+    def raise_for_status(self):
+        pass
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Count the identity requests made for concurrent logins."""
+
+    def setUp(self):
+        keystone.conf.CONF.set_override("enabled", True, group="cache")
+        self.addCleanup(
+            keystone.conf.CONF.clear_override, "enabled", group="cache"
+        )
+
+        for name in ("RXT_SERVICE_CACHE", "RXT_SESSION_CACHE"):
+            region = make_region().configure(
+                "dogpile.cache.memory", expiration_time=60
+            )
+            patcher = mock.patch.object(rackspace, name, region)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        rackspace._LOCAL_CACHE.clear()
+        self.addCleanup(rackspace._LOCAL_CACHE.clear)
+
+        self.posts = []
+        self.posts_lock = threading.Lock()
+        patcher = mock.patch.object(
+            rackspace._RXT_SESSION, "post", side_effect=self._post
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(
+            rackspace.RXTv2Credentials,
+            "_return_auth_handler",
+            autospec=True,
+            side_effect=lambda self, status=True, **kwargs: status,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.app = flask.Flask(__name__)
+
+    def _post(self, *args, **kwargs):
+        with self.posts_lock:
+            self.posts.append(kwargs.get("data"))
+        time.sleep(0.1)
+        return FakeResponse()
+
+    def _login(self, results):
+        auth_payload = {
+            "user": {
+                "name": "bob",
+                "password": "secrete",
+                "domain": {"name": "rackspace_cloud_domain"},
+            }
+        }
+        with self.app.test_request_context():
+            with rackspace.RXPWAuth(auth_payload=auth_payload) as rxt:
+                results.append(rxt.rxt_auth())
+
+    def test_concurrent_logins_post_once(self):
+        results = []
+        threads = [
+            threading.Thread(target=self._login, args=(results,))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([True] * 8, results)
+        self.assertEqual(1, len(self.posts))
+
+    def test_leader_rechecks_cache(self):
+        self._login([])
+        self.assertEqual(1, len(self.posts))
+
+        # A login which missed the cache before another login filled it must
+        # not post again once it becomes the leader.
+        auth_payload = {"user": {"name": "bob", "password": "secrete"}}
+        with self.app.test_request_context():
+            rxt = rackspace.RXPWAuth(auth_payload=auth_payload)
+            auth_type, auth_data = rxt._select_auth_payload()
+            self.assertTrue(
+                rxt.get_rxt_auth(auth_data=auth_data, auth_type=auth_type)
+            )
+
+        self.assertEqual(1, len(self.posts))
+
+    def test_refresh_releases_flight_when_thread_fails(self):
+        auth_payload = {"user": {"name": "bob", "password": "secrete"}}
+        with self.app.test_request_context():
+            rxt = rackspace.RXPWAuth(auth_payload=auth_payload)
+            with mock.patch.object(
+                rackspace.threading.Thread,
+                "start",
+                side_effect=RuntimeError("can't start new thread"),
+            ):
+                rxt._refresh_service_catalog()
+
+        self.assertNotIn(rxt.hashed_auth_payload, rackspace._INFLIGHT)
+        self.assertEqual(0, len(self.posts))